@@ -0,0 +1,94 @@
+"""
+Write Batching
+
+Coalesces bid writes that arrive within a few milliseconds of each other into
+one unordered bulk_write per collection, so a sniping rush costs a handful of
+round-trips instead of one (or two) per bid.
+"""
+
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# How long the first queued bid waits for company before the batch is written
+BATCH_WINDOW_SECONDS = 0.01
+MAX_BATCH_SIZE = 500
+
+_Pending = Tuple[InsertOne, Optional[UpdateOne], asyncio.Future]
+
+
+class BidWriter:
+    """Background task that writes queued bids (and auction updates) in bulk"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self._queue: "asyncio.Queue[Optional[_Pending]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write whatever is queued, then stop"""
+        if self._task is not None:
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+
+    async def write(self, bid_doc: dict, auction_update: Optional[UpdateOne] = None):
+        """Queue a stored bid document (and optional auction update); returns once both are written"""
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((InsertOne(bid_doc), auction_update, fut))
+        await fut
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                return
+            await asyncio.sleep(BATCH_WINDOW_SECONDS)
+            batch = [first]
+            stopping = False
+            while len(batch) < MAX_BATCH_SIZE and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[_Pending]):
+        # Bids are independent, so ordered=False lets the server apply them in parallel.
+        # Inserts go first: a batched auction update is only applied once its bid is written.
+        errors: Dict[int, Exception] = {}
+        try:
+            await self.db["bid"].bulk_write([insert for insert, _, _ in batch], ordered=False)
+        except Exception as e:
+            errors.update(_failed_positions(e, range(len(batch))))
+
+        updated = [i for i, (_, update, _) in enumerate(batch) if update is not None and i not in errors]
+        if updated:
+            try:
+                await self.db["auction"].bulk_write([batch[i][1] for i in updated], ordered=False)
+            except Exception as e:
+                errors.update(_failed_positions(e, updated))
+
+        for i, (_, _, fut) in enumerate(batch):
+            if fut.done():
+                continue
+            if i in errors:
+                fut.set_exception(errors[i])
+            else:
+                fut.set_result(None)
+
+
+def _failed_positions(e: Exception, positions: Sequence[int]) -> Dict[int, Exception]:
+    """Map a bulk_write error onto the batch positions whose write failed"""
+    if isinstance(e, BulkWriteError) and not e.details.get("writeConcernErrors"):
+        return {positions[err["index"]]: e for err in e.details.get("writeErrors", [])}
+    # Anything else (network, write concern) leaves the outcome unknown: fail them all
+    return {i: e for i in positions}
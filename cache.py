@@ -0,0 +1,235 @@
+"""
+Cache Helper Functions
+
+Redis helpers for the hot read paths of a live show.
+Redis is optional: if REDIS_URL is not set no client is created and callers
+fall back to MongoDB.
+"""
+
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+from redis.exceptions import WatchError
+import orjson
+from datetime import datetime
+import os
+from dotenv import load_dotenv
+from typing import Any, List, Optional
+
+from responses import dumps
+
+# Load environment variables from .env file
+load_dotenv()
+
+redis_url = os.getenv("REDIS_URL")
+
+# The live auction changes at human cadence; a short TTL bounds staleness
+AUCTION_TTL_SECONDS = 2
+# Number of most recent chat messages kept per show
+CHAT_HISTORY_SIZE = 200
+# Number of top bids kept per auction leaderboard
+BID_LEADERBOARD_SIZE = 200
+# Auction state outlives any realistic auction; after that bids fall back to MongoDB
+AUCTION_STATE_TTL_SECONDS = 24 * 60 * 60
+# Anti-snipe: a bid in the last 10s pushes the end to now + 10s
+ANTI_SNIPE_MS = 10000
+# Redis stops accepting bids at ends_at; the expiry loop waits this much longer before
+# ending the auction in Mongo, so a bid accepted just before the end is written first
+AUCTION_END_GRACE_SECONDS = 1
+
+# KEYS[1]: auction state hash, KEYS[2]: bid leaderboard
+# ARGV[1]: amount, ARGV[2]: leaderboard member, ARGV[3]: leaderboard size, ARGV[4]: anti-snipe ms,
+# ARGV[5]: leaderboard TTL
+_PLACE_BID_LUA = """
+local state = redis.call('HMGET', KEYS[1], 'status', 'current_price', 'ends_at', 'show_id', 'item_id')
+if not state[1] then return false end
+if state[1] ~= 'live' then return {'ended'} end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local ends_at = tonumber(state[3])
+if now > ends_at then return {'ended'} end
+if tonumber(ARGV[1]) <= tonumber(state[2]) then return {'low', state[2]} end
+if ends_at - now < tonumber(ARGV[4]) then ends_at = now + tonumber(ARGV[4]) end
+redis.call('HSET', KEYS[1], 'current_price', ARGV[1], 'ends_at', ends_at)
+redis.call('ZADD', KEYS[2], ARGV[1], ARGV[2])
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[3]) + 1))
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[5]))
+return {'ok', state[4], state[5], tostring(ends_at)}
+"""
+_place_bid_script = None
+
+
+def create_redis_client() -> Optional[Redis]:
+    """Create the shared Redis client, or None if Redis is not configured"""
+    if redis_url:
+        return Redis.from_url(redis_url)
+    return None
+
+
+def auction_key(show_id: str) -> str:
+    return f"auction:live:{show_id}"
+
+
+def auction_state_key(auction_id: str) -> str:
+    return f"auction:state:{auction_id}"
+
+
+def current_auction_id_key(show_id: str) -> str:
+    return f"auction:current_id:{show_id}"
+
+
+def bid_leaderboard_key(auction_id: str) -> str:
+    return f"bids:top:{auction_id}"
+
+
+def chat_key(show_id: str) -> str:
+    return f"chat:{show_id}"
+
+
+def chat_seeded_key(show_id: str) -> str:
+    return f"chat:seeded:{show_id}"
+
+
+def show_channel(show_id: str) -> str:
+    return f"show:{show_id}"
+
+
+async def get_json(r: Redis, key: str) -> Optional[Any]:
+    """Return the cached value for key, or None on a miss"""
+    raw = await r.get(key)
+    if raw is None:
+        return None
+    return orjson.loads(raw)
+
+
+async def set_json(r: Redis, key: str, value: Any, ttl: int):
+    await r.setex(key, ttl, dumps(value))
+
+
+async def push_chat(r: Redis, show_id: str, msg: dict):
+    """Prepend a message to the show's capped chat list"""
+    key = chat_key(show_id)
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.lpush(key, dumps(msg))
+        pipe.ltrim(key, 0, CHAT_HISTORY_SIZE - 1)
+        await pipe.execute()
+
+
+async def recent_chat(r: Redis, show_id: str, limit: int) -> Optional[List[bytes]]:
+    """Latest `limit` messages oldest first as pre-encoded JSON, or None if the cache can't answer.
+
+    The list only answers once seed_chat has loaded the show's history from MongoDB;
+    before that it may hold just the messages posted since Redis was (re)started.
+    A falsy limit means "all messages", which the capped list can't answer.
+    """
+    if not limit or limit > CHAT_HISTORY_SIZE:
+        return None
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.exists(chat_seeded_key(show_id))
+        pipe.lrange(chat_key(show_id), 0, limit - 1)
+        seeded, items = await pipe.execute()
+    if not seeded:
+        return None
+    items.reverse()
+    return items
+
+
+async def seed_chat(r: Redis, show_id: str, history: List[dict]):
+    """Load the show's latest messages (newest first, with "id") into the chat list.
+
+    Messages pushed by post_message while history was being read are merged in by id.
+    If another request seeds or pushes concurrently the seed is skipped; the next miss retries.
+    """
+    key, seeded_key = chat_key(show_id), chat_seeded_key(show_id)
+    async with r.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(key, seeded_key)
+            if await pipe.exists(seeded_key):
+                return
+            merged = {str(msg["id"]): dumps(msg) for msg in history}
+            for raw in await pipe.lrange(key, 0, -1):
+                merged.setdefault(str(orjson.loads(raw)["id"]), raw)
+            # ObjectId hex strings sort by creation time, like the Mongo (_id) order
+            items = [merged[i] for i in sorted(merged, reverse=True)[:CHAT_HISTORY_SIZE]]
+            pipe.multi()
+            pipe.delete(key)
+            if items:
+                pipe.rpush(key, *items)
+            pipe.set(seeded_key, 1)
+            await pipe.execute()
+        except WatchError:
+            pass
+
+
+async def open_auction(r: Redis, auction_id: str, show_id: str, item_id: str, price: float, ends_at: datetime):
+    """Make auction_id the show's live auction in Redis and close the previous one"""
+    previous = await r.getset(current_auction_id_key(show_id), auction_id)
+    state_key = auction_state_key(auction_id)
+    async with r.pipeline(transaction=False) as pipe:
+        if previous:
+            _end_auction(pipe, previous.decode())
+        pipe.hset(state_key, mapping={
+            "status": "live",
+            "current_price": repr(price),
+            "ends_at": int(ends_at.timestamp() * 1000),
+            "show_id": show_id,
+            "item_id": item_id,
+        })
+        pipe.expire(state_key, AUCTION_STATE_TTL_SECONDS)
+        pipe.expire(current_auction_id_key(show_id), AUCTION_STATE_TTL_SECONDS)
+        pipe.delete(auction_key(show_id))
+        await pipe.execute()
+
+
+def _end_auction(pipe, auction_id: str):
+    state_key = auction_state_key(auction_id)
+    pipe.hset(state_key, "status", "ended")
+    # Don't leave a TTL-less stub behind if the state had already expired
+    pipe.expire(state_key, AUCTION_STATE_TTL_SECONDS)
+
+
+async def close_auction(r: Redis, auction_id: str, show_id: str):
+    """Mark an auction ended in Redis, drop the show's cached auction and tell viewers"""
+    async with r.pipeline(transaction=False) as pipe:
+        _end_auction(pipe, auction_id)
+        pipe.delete(auction_key(show_id))
+        pipe.publish(show_channel(show_id), dumps({"type": "auction_ended", "auction_id": auction_id}))
+        await pipe.execute()
+
+
+async def try_place_bid(r: Redis, auction_id: str, amount: float, entry: dict) -> Optional[List[str]]:
+    """Atomically check and record a bid against the Redis copy of the auction.
+
+    Returns ["ok", show_id, item_id, ends_at_ms], ["low", current_price] or ["ended"],
+    or None if Redis doesn't hold this auction and the caller should use MongoDB.
+    """
+    global _place_bid_script
+    if _place_bid_script is None:
+        _place_bid_script = r.register_script(_PLACE_BID_LUA)
+    result = await _place_bid_script(
+        keys=[auction_state_key(auction_id), bid_leaderboard_key(auction_id)],
+        args=[repr(amount), dumps(entry), BID_LEADERBOARD_SIZE, ANTI_SNIPE_MS, AUCTION_STATE_TTL_SECONDS],
+        client=r,
+    )
+    if result is None:
+        return None
+    return [v.decode() for v in result]
+
+
+async def top_bids(r: Redis, auction_id: str, limit: int) -> Optional[List[bytes]]:
+    """Highest `limit` bids as pre-encoded JSON, or None if the cache can't answer"""
+    # A falsy limit means "all bids", which the capped leaderboard can't answer
+    if not limit or limit > BID_LEADERBOARD_SIZE:
+        return None
+    items = await r.zrevrange(bid_leaderboard_key(auction_id), 0, limit - 1)
+    return items or None
+
+
+async def publish(r: Redis, show_id: str, event: dict):
+    """Push an event to everyone subscribed to the show's channel"""
+    await r.publish(show_channel(show_id), dumps(event))
+
+
+async def subscribe(r: Redis, show_id: str) -> PubSub:
+    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(show_channel(show_id))
+    return pubsub
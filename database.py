@@ -3,53 +3,127 @@ Database Helper Functions
 
 MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
+The client is async (Motor) and is created once by the app's lifespan handler.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCursor, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+from bson import ObjectId
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
-from typing import Union
+from typing import Dict, List, Optional, Tuple, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
 load_dotenv()
 
-_client = None
-db = None
-
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+# Connection pool sizing: roughly the number of concurrent requests one worker
+# should keep in flight against Mongo (total = workers x MONGO_MAX_POOL_SIZE)
+max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+min_pool_size = int(os.getenv("MONGO_MIN_POOL_SIZE", 10))
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
+
+def create_client() -> Optional[AsyncIOMotorClient]:
+    """Create the shared Motor client, or None if the database is not configured"""
+    if database_url and database_name:
+        return AsyncIOMotorClient(
+            database_url,
+            maxPoolSize=max_pool_size,
+            minPoolSize=min(min_pool_size, max_pool_size),
+            serverSelectionTimeoutMS=5000,
+            retryWrites=True,
+            # Read datetimes back as UTC-aware, matching what the app writes and caches
+            tz_aware=True,
+        )
+    return None
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """Create the indexes backing the API's queries (no-op if they already exist)"""
+    await db["bid"].create_index([("auction_id", ASCENDING), ("amount", DESCENDING)])
+    await db["auction"].create_index([("show_id", ASCENDING), ("status", ASCENDING)])
+    # At most one live auction per show; keeps the "end current auction" update to one index entry
+    await db["auction"].create_index(
+        [("show_id", ASCENDING)], name="show_id_live", partialFilterExpression={"status": "live"}
+    )
+    # Only live auctions are scanned for expiry
+    await db["auction"].create_index(
+        [("ends_at", ASCENDING)], name="ends_at_live", partialFilterExpression={"status": "live"}
+    )
+    await db["item"].create_index("show_id")
+    await db["message"].create_index([("show_id", ASCENDING), ("_id", ASCENDING)])
+
+
+def utc_now() -> datetime:
+    """Current UTC time at BSON's millisecond precision, so cached copies equal stored ones"""
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def _require(db: Optional[AsyncIOMotorDatabase]) -> AsyncIOMotorDatabase:
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    return db
 
+
+# Helper functions for common database operations
+def new_document(data: Union[BaseModel, dict]) -> dict:
+    """Build the stored form of a document: a copy with `_id` and timestamps set.
+
+    Callers may pre-allocate `_id` (an ObjectId) to reference the document before it is written,
+    or build the document first to reuse its stored form (e.g. for a cache entry).
+    """
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
     else:
         data_dict = data.copy()
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    data_dict.setdefault('_id', ObjectId())
+    # Keep the stamps of a document already built by new_document
+    now = utc_now()
+    data_dict.setdefault('created_at', now)
+    data_dict.setdefault('updated_at', now)
+    return data_dict
 
-    result = db[collection_name].insert_one(data_dict)
-    return str(result.inserted_id)
+async def create_document(db: AsyncIOMotorDatabase, collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    db = _require(db)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+    data_dict = new_document(data)
+    await db[collection_name].insert_one(data_dict)
+    return str(data_dict['_id'])
+
+def find_documents(
+    db: AsyncIOMotorDatabase,
+    collection_name: str,
+    filter_dict: dict = None,
+    limit: int = None,
+    sort: List[Tuple[str, int]] = None,
+    projection: Dict[str, int] = None,
+) -> AsyncIOMotorCursor:
+    """Cursor over documents in collection, optionally sorted and projected server-side"""
+    db = _require(db)
+
+    cursor = db[collection_name].find(filter_dict or {}, projection)
+    if sort:
+        cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(limit)
-    
-    return list(cursor)
+    return cursor
+
+async def get_documents(
+    db: AsyncIOMotorDatabase,
+    collection_name: str,
+    filter_dict: dict = None,
+    limit: int = None,
+    sort: List[Tuple[str, int]] = None,
+    projection: Dict[str, int] = None,
+):
+    """Get documents from collection, optionally sorted and projected server-side"""
+    cursor = find_documents(db, collection_name, filter_dict, limit, sort, projection)
+    return await cursor.to_list(limit or None)
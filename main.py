@@ -1,32 +1,145 @@
 import os
+import re
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response, WebSocket
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from starlette.websockets import WebSocketState
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 
-from database import db, create_document, get_documents
+from database import (
+    database_name, utc_now, create_client, ensure_indexes, new_document, create_document, find_documents,
+    get_documents,
+)
+from batching import BidWriter
+from middleware import MinimalCORS
+from responses import MongoJSONResponse, stream_documents
+from cache import (
+    AUCTION_TTL_SECONDS, CHAT_HISTORY_SIZE, create_redis_client, auction_key, get_json, set_json,
+    push_chat, recent_chat, seed_chat,
+    ANTI_SNIPE_MS, AUCTION_END_GRACE_SECONDS, open_auction, close_auction, try_place_bid, top_bids, publish, subscribe,
+)
 
-app = FastAPI()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+logger = logging.getLogger(__name__)
+
+# Wait between index creation attempts while Mongo is unreachable
+INDEX_RETRY_SECONDS = 30
+# How often live auctions past their end time are closed
+EXPIRE_INTERVAL_SECONDS = 1
+
+
+async def build_indexes(db):
+    """Create the indexes, retrying until Mongo answers; startup doesn't wait on this"""
+    while True:
+        try:
+            await ensure_indexes(db)
+            return
+        except Exception:
+            logger.exception("Index creation failed, retrying in %ss", INDEX_RETRY_SECONDS)
+            await asyncio.sleep(INDEX_RETRY_SECONDS)
+
+
+async def expire_auctions(db, r):
+    """Background loop ending live auctions whose ends_at has passed, so requests only check status"""
+    while True:
+        await asyncio.sleep(EXPIRE_INTERVAL_SECONDS)
+        try:
+            now = utc_now()
+            # Redis rejects bids from ends_at on; the grace lets the last accepted ones reach Mongo
+            cutoff = now - timedelta(seconds=AUCTION_END_GRACE_SECONDS)
+            # One auction at a time: each is ended exactly once even with several workers running this loop
+            while True:
+                a = await db["auction"].find_one_and_update(
+                    {"status": "live", "ends_at": {"$lt": cutoff}},
+                    {"$set": {"status": "ended", "updated_at": now}},
+                    projection={"show_id": 1},
+                )
+                if not a:
+                    break
+                if r is not None:
+                    await close_auction(r, str(a["_id"]), a["show_id"])
+        except Exception:
+            logger.exception("Auction expiry failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One Motor client (and connection pool) per process
+    client = create_client()
+    app.state.db = client[database_name] if client is not None else None
+    app.state.bid_writer = None
+    app.state.redis = create_redis_client()
+    tasks = []
+    if app.state.db is not None:
+        # A down database must not stop the process from starting; /test and /ready report it
+        tasks.append(asyncio.create_task(build_indexes(app.state.db)))
+        tasks.append(asyncio.create_task(expire_auctions(app.state.db, app.state.redis)))
+        app.state.bid_writer = BidWriter(app.state.db)
+        app.state.bid_writer.start()
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        if app.state.bid_writer is not None:
+            await app.state.bid_writer.stop()
+        if client is not None:
+            client.close()
+        if app.state.redis is not None:
+            await app.state.redis.aclose()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=MongoJSONResponse)
+
+app.add_middleware(MinimalCORS)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    # FastAPI's default handler renders with stdlib json, which raises on the NaN/inf inputs
+    # it echoes back (e.g. a rejected bid amount); orjson writes them as null
+    return MongoJSONResponse({"detail": jsonable_encoder(exc.errors())}, status_code=422)
+
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Hello from FastAPI Backend!"}
 
 @app.get("/api/hello")
-def hello():
+async def hello():
     return {"message": "Hello from the backend API!"}
 
+@app.get("/health")
+async def health():
+    """Liveness: the process is serving requests. Never touches the database."""
+    return {"ok": True}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: the database answers a ping"""
+    db = app.state.db
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not configured")
+    try:
+        await db.command("ping")
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {str(e)[:50]}")
+    return {"ok": True}
+
+# list_collection_names() is a metadata round-trip; /test is polled by monitors
+COLLECTIONS_TTL_SECONDS = 60
+_collections_cache: Dict[str, Any] = {"t": 0.0, "v": None}
+
+
 @app.get("/test")
-def test_database():
+async def test_database():
+    db = app.state.db
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -42,7 +155,10 @@ def test_database():
             response["database_name"] = db.name if hasattr(db, 'name') else ("✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set")
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                if _collections_cache["v"] is None or time.monotonic() - _collections_cache["t"] >= COLLECTIONS_TTL_SECONDS:
+                    _collections_cache["v"] = await db.list_collection_names()
+                    _collections_cache["t"] = time.monotonic()
+                collections = _collections_cache["v"]
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -56,135 +172,249 @@ def test_database():
 # ----------------------------
 # Live Shopping API (MVP)
 # ----------------------------
-from schemas import Show, Item, Auction, Bid, Message
+from schemas import Show, Item
 from bson import ObjectId
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+
+
+# Fields returned by the list/current endpoints; everything else stays in Mongo
+SHOW_LIST_FIELDS = {"title": 1, "status": 1, "start_time": 1, "cover_image": 1}
+BID_LIST_FIELDS = {"amount": 1, "user_id": 1, "created_at": 1}
+CURRENT_AUCTION_FIELDS = {
+    "starting_price": 1, "current_price": 1, "ends_at": 1, "item_id": 1, "highest_bid_id": 1, "status": 1,
+}
+
+
+_is_object_id = re.compile(r"[0-9a-fA-F]{24}").fullmatch
 
 
 def oid(id_str: str):
-    try:
-        return ObjectId(id_str)
-    except Exception:
+    # Anything matching is a valid ObjectId, so the constructor can't raise
+    if not _is_object_id(id_str):
         raise HTTPException(status_code=400, detail="Invalid id")
+    return ObjectId(id_str)
 
 
 @app.post("/shows")
-def create_show(show: Show):
+async def create_show(show: Show):
     show_dict = show.model_dump()
-    show_id = create_document("show", show_dict)
+    show_id = await create_document(app.state.db, "show", show_dict)
     return {"id": show_id, **show_dict}
 
 
 @app.get("/shows")
-def list_shows(status: Optional[str] = None, limit: int = 20):
+async def list_shows(status: Optional[str] = None, limit: int = 20):
     filt: Dict[str, Any] = {}
     if status:
         filt["status"] = status
-    docs = get_documents("show", filt, limit)
-    # Convert ObjectId to string
-    for d in docs:
-        d["id"] = str(d.pop("_id"))
-    return docs
+    return stream_documents(find_documents(app.state.db, "show", filt, limit, projection=SHOW_LIST_FIELDS))
 
 
 @app.post("/items")
-def create_item(item: Item):
+async def create_item(item: Item):
     item_dict = item.model_dump()
-    item_id = create_document("item", item_dict)
+    item_id = await create_document(app.state.db, "item", item_dict)
     return {"id": item_id, **item_dict}
 
 
 @app.get("/shows/{show_id}/items")
-def list_items(show_id: str, limit: int = 50):
-    docs = get_documents("item", {"show_id": show_id}, limit)
-    for d in docs:
-        d["id"] = str(d.pop("_id"))
-    return docs
+async def list_items(show_id: str, limit: int = 50):
+    return stream_documents(find_documents(app.state.db, "item", {"show_id": show_id}, limit))
 
 
 class StartAuctionRequest(BaseModel):
     item_id: str
-    starting_price: float
+    starting_price: float = Field(..., ge=0)
     duration_seconds: int = 60
 
 
 @app.post("/shows/{show_id}/auctions/start")
-def start_auction(show_id: str, payload: StartAuctionRequest):
-    # End any existing live auction for this show
-    db["auction"].update_many({"show_id": show_id, "status": "live"}, {"$set": {"status": "ended"}})
-
-    ends_at = datetime.now(timezone.utc) + timedelta(seconds=payload.duration_seconds)
-    auction = Auction(
-        show_id=show_id,
-        item_id=payload.item_id,
-        status="live",
-        starting_price=payload.starting_price,
-        current_price=payload.starting_price,
-        ends_at=ends_at,
-        highest_bid_id=None,
-    ).model_dump()
-
-    auction_id = create_document("auction", auction)
+async def start_auction(show_id: str, payload: StartAuctionRequest):
+    db = app.state.db
+    now = utc_now()
+    ends_at = now + timedelta(seconds=payload.duration_seconds)
+    # Same fields as schemas.Auction; the request model already enforced its constraints
+    auction = {
+        "show_id": show_id,
+        "item_id": payload.item_id,
+        "status": "live",
+        "starting_price": payload.starting_price,
+        "current_price": payload.starting_price,
+        "ends_at": ends_at,
+        "highest_bid_id": None,
+    }
+
+    # End the show's live auction (at most one) and insert the new one in a single round-trip
+    auction_oid = ObjectId()
+    await db["auction"].bulk_write([
+        UpdateOne({"show_id": show_id, "status": "live"}, {"$set": {"status": "ended", "updated_at": now}}),
+        InsertOne({**auction, "_id": auction_oid, "created_at": now, "updated_at": now}),
+    ])
+    auction_id = str(auction_oid)
+    if app.state.redis is not None:
+        await open_auction(app.state.redis, auction_id, show_id, payload.item_id, payload.starting_price, ends_at)
     return {"id": auction_id, **auction}
 
 
 @app.get("/shows/{show_id}/auctions/current")
-def current_auction(show_id: str):
-    docs = list(db["auction"].find({"show_id": show_id, "status": "live"}).limit(1))
-    if not docs:
-        return {"auction": None}
-    a = docs[0]
-    a["id"] = str(a.pop("_id"))
-    return {"auction": a}
+async def current_auction(show_id: str):
+    r = app.state.redis
+    if r is not None:
+        cached = await get_json(r, auction_key(show_id))
+        if cached is not None:
+            return MongoJSONResponse(cached)
+
+    a = await app.state.db["auction"].find_one({"show_id": show_id, "status": "live"}, CURRENT_AUCTION_FIELDS)
+    if a:
+        a["id"] = a.pop("_id")
+    response = {"auction": a}
+    if r is not None:
+        await set_json(r, auction_key(show_id), response, AUCTION_TTL_SECONDS)
+    return MongoJSONResponse(response)
 
 
 class PlaceBidRequest(BaseModel):
     user_id: str
-    amount: float
+    # Same constraint as schemas.Bid; NaN would compare false against any price in the Lua check
+    amount: float = Field(..., gt=0, allow_inf_nan=False)
+
+
+def _bid_update(amount: float, bid_id: str) -> List[Dict[str, Any]]:
+    """Pipeline update applying a winning bid, with anti-snipe (extend to now + 10s if < 10s remaining)"""
+    return [{"$set": {
+        "current_price": amount,
+        "highest_bid_id": bid_id,
+        "ends_at": {"$cond": [
+            {"$and": [
+                {"$ne": [{"$ifNull": ["$ends_at", None]}, None]},
+                {"$lt": [{"$subtract": ["$ends_at", "$$NOW"]}, ANTI_SNIPE_MS]},
+            ]},
+            {"$add": ["$$NOW", ANTI_SNIPE_MS]},
+            "$ends_at",
+        ]},
+    }}]
+
+
+async def _record_bid(r, auction_oid: ObjectId, stored: Dict[str, Any]):
+    """Persist a bid Redis has already accepted"""
+    # Bids can land out of order; the price filter keeps the highest one.
+    # An auction the expiry loop has already ended is left alone.
+    auction_update = UpdateOne(
+        {"_id": auction_oid, "status": "live", "current_price": {"$lt": stored["amount"]}},
+        _bid_update(stored["amount"], str(stored["_id"])),
+    )
+    await app.state.bid_writer.write(stored, auction_update)
+    # Readers may have re-cached the auction from Mongo before this write landed
+    await r.delete(auction_key(stored["show_id"]))
+
+
+async def _revert_bid(db, auction_oid: ObjectId, auction_id: str, bid_id: str):
+    """Point an auction back at its highest written bid after the insert of bid_id failed"""
+    top = await db["bid"].find_one({"auction_id": auction_id}, {"amount": 1}, sort=[("amount", -1)])
+    # Only if no later bid has replaced it; an anti-snipe extension is left in place
+    await db["auction"].update_one(
+        {"_id": auction_oid, "highest_bid_id": bid_id},
+        [{"$set": {
+            "current_price": top["amount"] if top else "$starting_price",
+            "highest_bid_id": str(top["_id"]) if top else None,
+        }}],
+    )
 
 
 @app.post("/auctions/{auction_id}/bids")
-def place_bid(auction_id: str, payload: PlaceBidRequest):
-    a = db["auction"].find_one({"_id": oid(auction_id)})
-    if not a:
-        raise HTTPException(status_code=404, detail="Auction not found")
-    if a.get("status") != "live":
-        raise HTTPException(status_code=400, detail="Auction not live")
-
-    min_required = max(a.get("starting_price", 0), a.get("current_price", 0))
-    if payload.amount <= min_required:
-        raise HTTPException(status_code=400, detail=f"Bid must be greater than {min_required}")
-
-    bid = Bid(
-        show_id=a["show_id"],
-        item_id=a["item_id"],
-        auction_id=auction_id,
-        user_id=payload.user_id,
-        amount=payload.amount,
-    ).model_dump()
-    bid_id = create_document("bid", bid)
-
-    # Update auction
-    db["auction"].update_one({"_id": oid(auction_id)}, {"$set": {"current_price": payload.amount, "highest_bid_id": bid_id}})
-
-    # Optional anti-snipe: extend if < 10s remaining
-    if a.get("ends_at"):
-        now = datetime.now(timezone.utc)
-        remaining = a["ends_at"] - now
-        if remaining.total_seconds() < 10:
-            new_end = now + timedelta(seconds=10)
-            db["auction"].update_one({"_id": oid(auction_id)}, {"$set": {"ends_at": new_end}})
+async def place_bid(auction_id: str, payload: PlaceBidRequest, background_tasks: BackgroundTasks):
+    db = app.state.db
+    r = app.state.redis
+    auction_oid = oid(auction_id)
+    # Allocate the bid id up front so the auction can point at it before the bid is inserted
+    bid_oid = ObjectId()
+    bid_id = str(bid_oid)
+
+    # Shared by the leaderboard entry and the stored bid so both render the same timestamp
+    created_at = utc_now()
+
+    accepted = None
+    if r is not None:
+        # Redis holds the live auction's price and leaderboard; one script checks and records the bid
+        entry = {"id": bid_id, "amount": payload.amount, "user_id": payload.user_id, "created_at": created_at}
+        accepted = await try_place_bid(r, auction_id, payload.amount, entry)
+    if accepted is not None:
+        if accepted[0] == "ended":
+            raise HTTPException(status_code=400, detail="Auction not live")
+        if accepted[0] == "low":
+            raise HTTPException(status_code=400, detail=f"Bid must be greater than {float(accepted[1])}")
+        _, show_id, item_id, ends_at_ms = accepted
+        ends_at = datetime.fromtimestamp(int(ends_at_ms) / 1000, timezone.utc)
+    else:
+        # Price check, price update and anti-snipe in one atomic round-trip;
+        # concurrent lower bids fail the filter instead of racing
+        a = await db["auction"].find_one_and_update(
+            {"_id": auction_oid, "status": "live", "current_price": {"$lt": payload.amount}},
+            _bid_update(payload.amount, bid_id),
+            projection={"show_id": 1, "item_id": 1, "ends_at": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not a:
+            # Slow path only: work out which precondition failed
+            a = await db["auction"].find_one({"_id": auction_oid}, {"status": 1, "starting_price": 1, "current_price": 1})
+            if not a:
+                raise HTTPException(status_code=404, detail="Auction not found")
+            if a.get("status") != "live":
+                raise HTTPException(status_code=400, detail="Auction not live")
+            min_required = max(a.get("starting_price", 0), a.get("current_price", 0))
+            raise HTTPException(status_code=400, detail=f"Bid must be greater than {min_required}")
+        show_id, item_id, ends_at = a["show_id"], a["item_id"], a.get("ends_at")
+
+    # Same fields as schemas.Bid, built inline: everything but user_id comes from server state
+    # and PlaceBidRequest already enforces Bid's amount constraint
+    bid = {
+        "show_id": show_id,
+        "item_id": item_id,
+        "auction_id": auction_id,
+        "user_id": payload.user_id,
+        "amount": payload.amount,
+    }
+    stored = new_document({**bid, "_id": bid_oid, "created_at": created_at, "updated_at": created_at})
+    if accepted is not None:
+        # Mongo is the durable copy; write it after responding
+        background_tasks.add_task(_record_bid, r, auction_oid, stored)
+    else:
+        # Coalesced with concurrent bids into one bulk insert. The auction already points at
+        # this bid, so if the insert fails it is pointed back before the client is told.
+        try:
+            await app.state.bid_writer.write(stored)
+        except Exception:
+            logger.exception("Bid %s could not be written", bid_id)
+            await _revert_bid(db, auction_oid, auction_id, bid_id)
+            raise HTTPException(status_code=503, detail="Bid could not be recorded, please retry")
+
+    if r is not None:
+        event = {
+            "type": "bid",
+            "id": bid_id,
+            "auction_id": auction_id,
+            "user_id": payload.user_id,
+            "amount": payload.amount,
+            "ends_at": ends_at,
+        }
+        await asyncio.gather(r.delete(auction_key(show_id)), publish(r, show_id, event))
 
     return {"id": bid_id, **bid}
 
 
 @app.get("/auctions/{auction_id}/bids")
-def list_bids(auction_id: str, limit: int = 50):
-    docs = get_documents("bid", {"auction_id": auction_id}, limit)
-    # Sort highest first
-    docs.sort(key=lambda x: x.get("amount", 0), reverse=True)
-    for d in docs:
-        d["id"] = str(d.pop("_id"))
-    return docs
+async def list_bids(auction_id: str, limit: int = 50):
+    if app.state.redis is not None:
+        # Leaderboard members are already-encoded JSON objects, highest first
+        cached = await top_bids(app.state.redis, auction_id, limit)
+        if cached is not None:
+            return Response(b"[" + b",".join(cached) + b"]", media_type="application/json")
+
+    # Highest first, served by the (auction_id, amount desc) index
+    cursor = find_documents(
+        app.state.db, "bid", {"auction_id": auction_id}, limit, sort=[("amount", -1)], projection=BID_LIST_FIELDS
+    )
+    return stream_documents(cursor)
 
 
 class MessageRequest(BaseModel):
@@ -193,23 +423,93 @@ class MessageRequest(BaseModel):
 
 
 @app.post("/shows/{show_id}/messages")
-def post_message(show_id: str, payload: MessageRequest):
-    msg = Message(show_id=show_id, user_id=payload.user_id, text=payload.text).model_dump()
-    msg_id = create_document("message", msg)
+async def post_message(show_id: str, payload: MessageRequest):
+    # Same fields as schemas.Message; MessageRequest already validated the user input
+    msg = {"show_id": show_id, "user_id": payload.user_id, "text": payload.text, "type": "text"}
+    stored = new_document(msg)
+    msg_id = await create_document(app.state.db, "message", stored)
+    r = app.state.redis
+    if r is not None:
+        doc = {"id": msg_id, **msg, "created_at": stored["created_at"], "updated_at": stored["updated_at"]}
+        await asyncio.gather(push_chat(r, show_id, doc), publish(r, show_id, {"type": "message", **doc}))
     return {"id": msg_id, **msg}
 
 
 @app.get("/shows/{show_id}/messages")
-def list_messages(show_id: str, limit: int = 50):
-    docs = get_documents("message", {"show_id": show_id}, limit)
+async def list_messages(show_id: str, limit: int = 50):
+    r = app.state.redis
+    # limit=0 means no limit, which only Mongo can answer
+    use_cache = r is not None and 0 < limit <= CHAT_HISTORY_SIZE
+    if use_cache:
+        # List entries are already-encoded JSON objects, oldest first
+        cached = await recent_chat(r, show_id, limit)
+        if cached is not None:
+            return Response(b"[" + b",".join(cached) + b"]", media_type="application/json")
+
+    # Latest messages, newest first. ObjectIds start with their creation time,
+    # so _id order is insertion order and the (show_id, _id) index serves the sort.
+    # On a cache miss read enough history to seed the chat list.
+    fetch = CHAT_HISTORY_SIZE if use_cache else limit
+    docs = await get_documents(app.state.db, "message", {"show_id": show_id}, fetch, sort=[("_id", -1)])
     for d in docs:
-        d["id"] = str(d.pop("_id"))
-    # Order newest last
-    docs.sort(key=lambda x: x.get("created_at"))
-    return docs
+        d["id"] = d.pop("_id")
+    if use_cache:
+        await seed_chat(r, show_id, docs)
+    # Newest last; the reversed page can't be streamed in cursor order
+    if limit:
+        docs = docs[:limit]
+    docs.reverse()
+    return MongoJSONResponse(docs)
+
+
+@app.websocket("/shows/{show_id}/ws")
+async def show_events(websocket: WebSocket, show_id: str):
+    """Push bids and chat messages for a show as they happen, instead of clients polling"""
+    r = app.state.redis
+    if r is None:
+        # Live updates need Redis Pub/Sub; rejects the handshake
+        await websocket.close()
+        return
+    await websocket.accept()
+    pubsub = await subscribe(r, show_id)
+
+    async def forward():
+        async for message in pubsub.listen():
+            await websocket.send_text(message["data"].decode())
+
+    async def until_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(forward()), asyncio.create_task(until_disconnect())]
+    try:
+        # Either the client went away or the socket/subscription failed; tear both down
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                logger.error("Live updates for show %s stopped", show_id, exc_info=task.exception())
+    finally:
+        for task in tasks:
+            task.cancel()
+        await pubsub.aclose()
+        if websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close(code=1011)
+            except Exception:
+                # The transport is already gone; nothing left to tell the client
+                pass
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Each worker process runs its own lifespan, so gets its own Motor/Redis clients
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        log_level="warning",
+    )
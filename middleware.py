@@ -0,0 +1,64 @@
+"""
+CORS Middleware
+
+Minimal ASGI CORS handling for a public JSON API. Every origin is allowed, so
+there is nothing to match per request: the request's Origin is echoed back
+with pre-encoded headers, and preflights are answered here without reaching
+the app.
+"""
+
+from typing import List, Tuple
+
+_SIMPLE_HEADERS: List[Tuple[bytes, bytes]] = [
+    (b"access-control-allow-credentials", b"true"),
+    (b"vary", b"Origin"),
+]
+_PREFLIGHT_HEADERS: List[Tuple[bytes, bytes]] = _SIMPLE_HEADERS + [
+    (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+    (b"access-control-max-age", b"600"),
+    (b"content-length", b"0"),
+]
+
+
+class MinimalCORS:
+    """Allow any origin (with credentials), like CORSMiddleware(allow_origins=["*"], ...)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = request_headers = None
+        is_preflight = False
+        for key, value in scope["headers"]:
+            if key == b"origin":
+                origin = value
+            elif key == b"access-control-request-method":
+                is_preflight = True
+            elif key == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            # Not a cross-origin request
+            await self.app(scope, receive, send)
+            return
+
+        if is_preflight and scope["method"] == "OPTIONS":
+            headers = [(b"access-control-allow-origin", origin)] + _PREFLIGHT_HEADERS
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 204, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", ()), (b"access-control-allow-origin", origin), *_SIMPLE_HEADERS
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
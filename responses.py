@@ -0,0 +1,47 @@
+"""
+Response Helpers
+
+JSON rendering with orjson. orjson serializes datetimes natively; the default
+hook below adds BSON ObjectIds so Mongo documents can be returned as-is.
+"""
+
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorCursor
+from bson import ObjectId
+import orjson
+from typing import Any, AsyncIterator
+
+
+def _default(o: Any):
+    if isinstance(o, ObjectId):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MongoJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also understands ObjectId.
+
+    Returning it directly from a handler skips FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+async def _json_array(cursor: AsyncIOMotorCursor) -> AsyncIterator[bytes]:
+    yield b"["
+    first = True
+    async for doc in cursor:
+        doc["id"] = doc.pop("_id")
+        yield dumps(doc) if first else b"," + dumps(doc)
+        first = False
+    yield b"]"
+
+
+def stream_documents(cursor: AsyncIOMotorCursor) -> StreamingResponse:
+    """Stream a cursor as a JSON array (exposing `_id` as "id") while Mongo returns documents"""
+    return StreamingResponse(_json_array(cursor), media_type="application/json")
@@ -0,0 +1,128 @@
+"""Tests for batching.BidWriter against an in-memory stand-in for the Motor database."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("motor")
+
+from pymongo import UpdateOne  # noqa: E402
+from pymongo.errors import AutoReconnect, BulkWriteError  # noqa: E402
+
+from batching import BidWriter  # noqa: E402
+
+
+class FakeCollection:
+    def __init__(self, name, log, fail=None):
+        self.name = name
+        self.log = log
+        self.fail = fail
+
+    async def bulk_write(self, ops, ordered=True):
+        self.log.append((self.name, list(ops), ordered))
+        if self.fail is not None:
+            raise self.fail(ops)
+
+
+class FakeDB:
+    def __init__(self, bid_fail=None, auction_fail=None):
+        self.log = []
+        self.collections = {
+            "bid": FakeCollection("bid", self.log, bid_fail),
+            "auction": FakeCollection("auction", self.log, auction_fail),
+        }
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+def _update(n):
+    return UpdateOne({"_id": n}, {"$set": {"current_price": n}})
+
+
+async def _write_all(writer, docs_and_updates):
+    return await asyncio.gather(
+        *(writer.write(doc, update) for doc, update in docs_and_updates), return_exceptions=True
+    )
+
+
+def test_concurrent_bids_share_one_batch_inserts_first():
+    async def scenario():
+        db = FakeDB()
+        writer = BidWriter(db)
+        writer.start()
+        results = await _write_all(writer, [({"n": 1}, _update(1)), ({"n": 2}, None), ({"n": 3}, _update(3))])
+        await writer.stop()
+        return db.log, results
+
+    log, results = asyncio.run(scenario())
+    assert results == [None, None, None]
+    assert [name for name, _, _ in log] == ["bid", "auction"]
+    assert len(log[0][1]) == 3 and len(log[1][1]) == 2
+    assert all(ordered is False for _, _, ordered in log)
+
+
+def test_failed_insert_skips_its_auction_update_only():
+    def dup_second(ops):
+        return BulkWriteError({"writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate"}]})
+
+    async def scenario():
+        db = FakeDB(bid_fail=dup_second)
+        writer = BidWriter(db)
+        writer.start()
+        results = await _write_all(writer, [({"n": 1}, _update(1)), ({"n": 2}, _update(2)), ({"n": 3}, _update(3))])
+        await writer.stop()
+        return db.log, results
+
+    log, results = asyncio.run(scenario())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], BulkWriteError)
+    # highest_bid_id must never point at the bid that wasn't written
+    assert log[1][0] == "auction"
+    assert log[1][1] == [_update(1), _update(3)]
+
+
+def test_unknown_insert_outcome_fails_whole_batch():
+    async def scenario():
+        db = FakeDB(bid_fail=lambda ops: AutoReconnect("connection lost"))
+        writer = BidWriter(db)
+        writer.start()
+        results = await _write_all(writer, [({"n": 1}, _update(1)), ({"n": 2}, None)])
+        await writer.stop()
+        return db.log, results
+
+    log, results = asyncio.run(scenario())
+    assert all(isinstance(r, AutoReconnect) for r in results)
+    assert [name for name, _, _ in log] == ["bid"]
+
+
+def test_failed_auction_update_fails_that_bid():
+    def fail_first(ops):
+        return BulkWriteError({"writeErrors": [{"index": 0, "code": 2, "errmsg": "bad update"}]})
+
+    async def scenario():
+        db = FakeDB(auction_fail=fail_first)
+        writer = BidWriter(db)
+        writer.start()
+        results = await _write_all(writer, [({"n": 1}, None), ({"n": 2}, _update(2)), ({"n": 3}, _update(3))])
+        await writer.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], BulkWriteError)
+
+
+def test_stop_flushes_queued_bids():
+    async def scenario():
+        db = FakeDB()
+        writer = BidWriter(db)
+        writer.start()
+        pending = [asyncio.create_task(writer.write({"n": n})) for n in range(5)]
+        await asyncio.sleep(0)
+        await writer.stop()
+        return db.log, [task.done() and task.exception() is None for task in pending]
+
+    log, done = asyncio.run(scenario())
+    assert all(done)
+    assert sum(len(ops) for name, ops, _ in log if name == "bid") == 5
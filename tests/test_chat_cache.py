@@ -0,0 +1,86 @@
+"""Tests for the Redis chat history in cache.py (seed_chat / recent_chat, against fakeredis)."""
+
+import asyncio
+
+import orjson
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from redis.asyncio.client import Pipeline  # noqa: E402
+
+import cache  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def _msg(n, show_id="s1"):
+    # Ids sort like ObjectId hex strings: later messages compare greater
+    return {"id": f"{n:024x}", "show_id": show_id, "text": f"m{n}"}
+
+
+def _texts(items):
+    return [orjson.loads(raw)["text"] for raw in items]
+
+
+def test_unseeded_cache_falls_back_to_mongo():
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        # Only messages posted since Redis started: not the whole history
+        await cache.push_chat(r, "s1", _msg(5))
+        return await cache.recent_chat(r, "s1", 10)
+
+    assert run(scenario()) is None
+
+
+def test_seed_merges_pushed_messages_in_id_order(monkeypatch):
+    monkeypatch.setattr(cache, "CHAT_HISTORY_SIZE", 4)
+
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        # Posted while history was being read from Mongo; 3 is also in the history
+        await cache.push_chat(r, "s1", _msg(3))
+        await cache.push_chat(r, "s1", _msg(6))
+        history = [_msg(n) for n in (5, 4, 3, 2, 1)]  # newest first, as list_messages reads it
+        await cache.seed_chat(r, "s1", history)
+        return await cache.recent_chat(r, "s1", 4), await r.llen(cache.chat_key("s1"))
+
+    recent, length = run(scenario())
+    assert _texts(recent) == ["m3", "m4", "m5", "m6"]
+    assert length == 4
+
+
+def test_seed_is_skipped_once_seeded():
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        await cache.seed_chat(r, "s1", [_msg(1)])
+        await cache.seed_chat(r, "s1", [_msg(9)])
+        return await cache.recent_chat(r, "s1", 10)
+
+    assert _texts(run(scenario())) == ["m1"]
+
+
+def test_push_during_seed_aborts_it(monkeypatch):
+    original_watch = Pipeline.watch
+
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+
+        async def watch_then_push(self, *names):
+            await original_watch(self, *names)
+            # A concurrent post_message lands between WATCH and EXEC
+            await cache.push_chat(r, "s1", _msg(7))
+
+        monkeypatch.setattr(Pipeline, "watch", watch_then_push)
+        await cache.seed_chat(r, "s1", [_msg(1)])
+        monkeypatch.setattr(Pipeline, "watch", original_watch)
+        seeded = await r.exists(cache.chat_seeded_key("s1"))
+        return seeded, await cache.recent_chat(r, "s1", 10), await r.lrange(cache.chat_key("s1"), 0, -1)
+
+    seeded, recent, items = run(scenario())
+    assert not seeded
+    assert recent is None
+    # The pushed message is kept; the next miss seeds around it
+    assert _texts(items) == ["m7"]
@@ -0,0 +1,79 @@
+"""Tests for middleware.MinimalCORS in front of a small Starlette app."""
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from starlette.applications import Starlette  # noqa: E402
+from starlette.responses import PlainTextResponse  # noqa: E402
+from starlette.routing import Route, WebSocketRoute  # noqa: E402
+from starlette.testclient import TestClient  # noqa: E402
+
+from middleware import MinimalCORS  # noqa: E402
+
+ORIGIN = "https://shop.example"
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def client(calls):
+    async def hello(request):
+        calls.append(request.method)
+        return PlainTextResponse("hi", headers={"x-app": "1"})
+
+    async def echo(websocket):
+        await websocket.accept()
+        await websocket.send_text(await websocket.receive_text())
+        await websocket.close()
+
+    app = Starlette(routes=[Route("/hello", hello, methods=["GET", "POST"]), WebSocketRoute("/ws", echo)])
+    return TestClient(MinimalCORS(app))
+
+
+def test_simple_request_gets_cors_headers(client, calls):
+    response = client.get("/hello", headers={"Origin": ORIGIN})
+
+    assert response.status_code == 200
+    assert response.text == "hi"
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert response.headers["vary"] == "Origin"
+    # The app's own headers are kept
+    assert response.headers["x-app"] == "1"
+    assert calls == ["GET"]
+
+
+def test_preflight_is_answered_without_the_app(client, calls):
+    response = client.options("/hello", headers={
+        "Origin": ORIGIN,
+        "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "content-type, x-token",
+    })
+
+    assert response.status_code == 204
+    assert response.content == b""
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert response.headers["access-control-allow-methods"] == "DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+    assert response.headers["access-control-allow-headers"] == "content-type, x-token"
+    assert response.headers["access-control-max-age"] == "600"
+    assert calls == []
+
+
+def test_request_without_origin_is_untouched(client, calls):
+    response = client.get("/hello")
+
+    assert response.status_code == 200
+    assert not any(key.startswith("access-control-") for key in response.headers)
+    assert "vary" not in response.headers
+    assert calls == ["GET"]
+
+
+def test_websocket_passes_through(client):
+    with client.websocket_connect("/ws", headers={"Origin": ORIGIN}) as ws:
+        ws.send_text("ping")
+        assert ws.receive_text() == "ping"
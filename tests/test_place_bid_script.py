@@ -0,0 +1,126 @@
+"""Tests for the Redis bid script in cache.py (run against fakeredis' Lua engine)."""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+import cache  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _open(r, auction_id="a1", price=10.0, ends_in=60):
+    ends_at = datetime.now(timezone.utc) + timedelta(seconds=ends_in)
+    await cache.open_auction(r, auction_id, "s1", "i1", price, ends_at)
+    return ends_at
+
+
+def _entry(amount, user_id="u1"):
+    return {"id": f"bid-{amount}", "amount": amount, "user_id": user_id}
+
+
+@pytest.fixture(autouse=True)
+def fresh_script(monkeypatch):
+    # The script object is cached per process; start each test unregistered
+    monkeypatch.setattr(cache, "_place_bid_script", None)
+
+
+def test_unknown_auction_falls_back():
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        return await cache.try_place_bid(r, "missing", 20.0, _entry(20.0))
+
+    assert run(scenario()) is None
+
+
+def test_accepts_higher_bid_and_records_it():
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        ends_at = await _open(r)
+        result = await cache.try_place_bid(r, "a1", 12.5, _entry(12.5))
+        price = await r.hget(cache.auction_state_key("a1"), "current_price")
+        top = await cache.top_bids(r, "a1", 10)
+        return result, ends_at, price, top
+
+    result, ends_at, price, top = run(scenario())
+    assert result[:3] == ["ok", "s1", "i1"]
+    # Far from the end: ends_at is unchanged
+    assert int(result[3]) == int(ends_at.timestamp() * 1000)
+    assert float(price) == 12.5
+    assert len(top) == 1
+
+
+def test_rejects_bid_not_above_current_price():
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        await _open(r)
+        await cache.try_place_bid(r, "a1", 15.0, _entry(15.0))
+        return await cache.try_place_bid(r, "a1", 15.0, _entry(15.0, "u2"))
+
+    assert run(scenario()) == ["low", "15.0"]
+
+
+def test_rejects_bid_on_ended_auction():
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        await _open(r, "old")
+        # Starting the show's next auction ends the previous one
+        await _open(r, "new")
+        return await cache.try_place_bid(r, "old", 50.0, _entry(50.0))
+
+    assert run(scenario()) == ["ended"]
+
+
+def test_rejects_bid_just_past_end():
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        # Still inside the expiry loop's grace, but Redis no longer takes bids
+        await _open(r, ends_in=-cache.AUCTION_END_GRACE_SECONDS / 2)
+        result = await cache.try_place_bid(r, "a1", 50.0, _entry(50.0))
+        top = await cache.top_bids(r, "a1", 10)
+        return result, top
+
+    result, top = run(scenario())
+    assert result == ["ended"]
+    assert top is None
+
+
+def test_bid_just_before_end_is_accepted():
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        await _open(r, ends_in=0.3)
+        return await cache.try_place_bid(r, "a1", 11.0, _entry(11.0))
+
+    assert run(scenario())[0] == "ok"
+
+
+def test_late_bid_extends_end():
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        await _open(r, ends_in=2)
+        return await cache.try_place_bid(r, "a1", 11.0, _entry(11.0))
+
+    result = run(scenario())
+    assert result[0] == "ok"
+    remaining_ms = int(result[3]) - time.time() * 1000
+    assert cache.ANTI_SNIPE_MS - 1000 < remaining_ms <= cache.ANTI_SNIPE_MS
+
+
+def test_leaderboard_is_capped_highest_first(monkeypatch):
+    monkeypatch.setattr(cache, "BID_LEADERBOARD_SIZE", 3)
+
+    async def scenario():
+        r = fakeredis.FakeAsyncRedis()
+        await _open(r)
+        for amount in (11.0, 12.0, 13.0, 14.0, 15.0):
+            assert (await cache.try_place_bid(r, "a1", amount, _entry(amount)))[0] == "ok"
+        return await r.zrevrange(cache.bid_leaderboard_key("a1"), 0, -1, withscores=True)
+
+    assert [score for _, score in run(scenario())] == [15.0, 14.0, 13.0]